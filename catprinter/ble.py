@@ -1,7 +1,7 @@
 import asyncio
 import contextlib
 import uuid
-from typing import Optional
+from typing import Optional, Union
 
 from bleak import BleakClient, BleakScanner
 from bleak.backends.scanner import AdvertisementData
@@ -21,8 +21,14 @@ TX_CHARACTERISTIC_UUID = '0000ae01-0000-1000-8000-00805f9b34fb'
 
 SCAN_TIMEOUT_S = 10
 
-# Wait time after sending each chunk of data through BLE.
-WAIT_AFTER_EACH_CHUNK_S = 0.02
+# Number of chunks written concurrently before pausing. The pause is what keeps the
+# printer from dropping data, so by default we send one chunk at a time. Larger windows
+# (opt-in through run_ble's write_window) are faster but have not been proven safe on
+# every printer.
+WRITE_WINDOW_CHUNKS = 1
+
+# Wait time after sending each window of chunks through BLE.
+WAIT_AFTER_EACH_WINDOW_S = 0.02
 
 # This is a hacky solution so we don't terminate the BLE connection to the printer
 # while it's still printing. A better solution is to subscribe to the RX characteristic
@@ -35,7 +41,7 @@ async def scan(name: Optional[str], timeout: int):
     if autodiscover:
         logger.info('⏳ Trying to auto-discover a printer...')
     else:
-        logger.info(f'⏳ Looking for a BLE device named {name}...')
+        logger.info('⏳ Looking for a BLE device named %s...', name)
 
     def filter_fn(device: BLEDevice, adv_data: AdvertisementData):
         if autodiscover:
@@ -49,7 +55,7 @@ async def scan(name: Optional[str], timeout: int):
     )
     if device is None:
         raise RuntimeError('Unable to find printer, make sure it is turned on and in range')
-    logger.info(f'✅ Got it. Address: {device}')
+    logger.info('✅ Got it. Address: %s', device)
     return device
 
 
@@ -59,7 +65,10 @@ def chunkify(data, chunk_size):
     )
 
 
-async def get_device_address(device: Optional[str]):
+async def get_device_address(device: Union[str, BLEDevice, None]):
+    # Nothing to do if we were handed an already discovered device.
+    if isinstance(device, BLEDevice):
+        return device
     # See if we were passed a string that smells like an UUID or MAC address.
     if device:
         with contextlib.suppress(ValueError):
@@ -70,21 +79,31 @@ async def get_device_address(device: Optional[str]):
     return await scan(device, timeout=SCAN_TIMEOUT_S)
 
 
-async def run_ble(data, device: Optional[str]):
+async def run_ble(data, device: Union[str, BLEDevice, None], write_window: int = WRITE_WINDOW_CHUNKS):
+    await run_ble_many([data], device, write_window=write_window)
+
+
+async def run_ble_many(payloads, device: Union[str, BLEDevice, None],
+                       write_window: int = WRITE_WINDOW_CHUNKS):
+    '''Sends each payload in turn over a single BLE connection to the printer.'''
     try:
         address = await get_device_address(device)
     except RuntimeError as e:
-        logger.error(f'🛑 {e}')
+        logger.error('🛑 %s', e)
         return
-    logger.info(f'⏳ Connecting to {address}...')
+    logger.info('⏳ Connecting to %s...', address)
     async with BleakClient(address) as client:
         logger.info(
-            f'✅ Connected: {client.is_connected}; MTU: {client.mtu_size}')
+            '✅ Connected: %s; MTU: %d', client.is_connected, client.mtu_size)
         chunk_size = client.mtu_size - 3
-        logger.info(
-            f'⏳ Sending {len(data)} bytes of data in chunks of {chunk_size} bytes...')
-        for i, chunk in enumerate(chunkify(data, chunk_size)):
-            await client.write_gatt_char(TX_CHARACTERISTIC_UUID, chunk)
-            await asyncio.sleep(WAIT_AFTER_EACH_CHUNK_S)
-        logger.info(f'✅ Done. Waiting {WAIT_AFTER_DATA_SENT_S}s before disconnecting...')
+        for data in payloads:
+            logger.info(
+                '⏳ Sending %d bytes of data in chunks of %d bytes...', len(data), chunk_size)
+            chunks = list(chunkify(data, chunk_size))
+            for i in range(0, len(chunks), write_window):
+                await asyncio.gather(*(
+                    client.write_gatt_char(TX_CHARACTERISTIC_UUID, chunk, response=False)
+                    for chunk in chunks[i: i + write_window]))
+                await asyncio.sleep(WAIT_AFTER_EACH_WINDOW_S)
+        logger.info('✅ Done. Waiting %ss before disconnecting...', WAIT_AFTER_DATA_SENT_S)
         await asyncio.sleep(WAIT_AFTER_DATA_SENT_S)
@@ -1,3 +1,4 @@
+import numpy as np
 
 PRINT_WIDTH = 384
 
@@ -125,16 +126,8 @@ def run_length_encode(img_row):
 
 
 def byte_encode(img_row):
-    def bit_encode(chunk_start, bit_index):
-        return 1 << bit_index if img_row[chunk_start + bit_index] else 0
-
-    res = []
-    for chunk_start in range(0, len(img_row), 8):
-        byte = 0
-        for bit_index in range(8):
-            byte |= bit_encode(chunk_start, bit_index)
-        res.append(byte)
-    return res
+    # Packs 8 pixels per byte, with the leftmost pixel in the least significant bit.
+    return np.packbits(np.asarray(img_row, dtype=np.uint8), bitorder='little').tolist()
 
 
 def cmd_print_row(img_row):
@@ -1,92 +1,83 @@
 import cv2
-from math import ceil
 import numpy as np
 
 from catprinter import logger
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+
+def _floyd_steinberg_rows(img):
+    '''Floyd-Steinberg dithering of img, which is left untouched. Returns a 8-bit image with
+    values of either 0 or 255.
+
+    Only the row being dithered and the one below it receive error, so we keep just
+    those two rows in float64 scratch buffers and swap them as we move down. This is
+    JIT-compiled with numba when it's installed; both versions give the same result.
+    '''
+    h, w = img.shape
+    out = np.empty((h, w), np.uint8)
+    r0 = np.empty(w, np.float64)
+    r1 = np.empty(w, np.float64)
+    for x in range(w):
+        r0[x] = img[0, x]
+    for y in range(h):
+        if y + 1 < h:
+            for x in range(w):
+                r1[x] = img[y + 1, x]
+        for x in range(w):
+            old_val = r0[x]
+            new_val = 255.0 if old_val > 127.0 else 0.0
+            out[y, x] = 255 if old_val > 127.0 else 0
+            err = old_val - new_val
+            if x + 1 < w:
+                r0[x + 1] = min(255.0, max(0.0, r0[x + 1] + err * 7 / 16))
+                r1[x + 1] = min(255.0, max(0.0, r1[x + 1] + err * 1 / 16))
+            if x > 0:
+                r1[x - 1] = min(255.0, max(0.0, r1[x - 1] + err * 3 / 16))
+            r1[x] = min(255.0, max(0.0, r1[x] + err * 5 / 16))
+        r0, r1 = r1, r0
+    return out
+
+
+if njit is not None:
+    # No fastmath, so the compiled version rounds exactly like the Python one.
+    _floyd_steinberg_rows = njit(cache=True)(_floyd_steinberg_rows)
+
 
 def floyd_steinberg_dither(img):
-    '''Applies the Floyd-Steinberf dithering to img, in place.
+    '''Applies the Floyd-Steinberg dithering to img, in place.
     img is expected to be a 8-bit grayscale image.
 
     Algorithm borrowed from wikipedia.org/wiki/Floyd%E2%80%93Steinberg_dithering.
     '''
-    h, w = img.shape
+    img[:] = _floyd_steinberg_rows(img)
+    return img
 
-    def adjust_pixel(y, x, delta):
-        if y < 0 or y >= h or x < 0 or x >= w:
-            return
-        img[y][x] = min(255, max(0, img[y][x] + delta))
 
-    for y in range(h):
-        for x in range(w):
-            new_val = 255 if img[y][x] > 127 else 0
-            err = img[y][x] - new_val
-            img[y][x] = new_val
-            adjust_pixel(y, x + 1, err * 7/16)
-            adjust_pixel(y + 1, x - 1, err * 3/16)
-            adjust_pixel(y + 1, x, err * 5/16)
-            adjust_pixel(y + 1, x + 1, err * 1/16)
-    return img
+# 8x8 Bayer matrix, scaled to the [0, 255] range of our grayscale images.
+_BAYER8 = np.array([
+    [0, 32, 8, 40, 2, 34, 10, 42],
+    [48, 16, 56, 24, 50, 18, 58, 26],
+    [12, 44, 4, 36, 14, 46, 6, 38],
+    [60, 28, 52, 20, 62, 30, 54, 22],
+    [3, 35, 11, 43, 1, 33, 9, 41],
+    [51, 19, 59, 27, 49, 17, 57, 25],
+    [15, 47, 7, 39, 13, 45, 5, 37],
+    [63, 31, 55, 23, 61, 29, 53, 21],
+], dtype=np.uint8) * 4
 
 
 def halftone_dither(img):
-    '''Applies Haltone dithering using different sized circles
-
-    Algorithm is borrowed from https://github.com/GravO8/halftone
+    '''Applies halftone (ordered) dithering to img using a tiled 8x8 Bayer matrix.
+    img is expected to be a 8-bit grayscale image. Returns an image of the same size with
+    values of either 0 or 255.
     '''
-
-    def square_avg_value(square):
-        '''
-        Calculates the average grayscale value of the pixels in a square of the
-        original image
-        Argument:
-            square: List of N lists, each with N integers whose value is between 0
-            and 255
-        '''
-        sum = 0
-        n = 0
-        for row in square:
-            for pixel in row:
-                sum += pixel
-                n += 1
-        return sum/n
-
-    side = 4
-    jump = 4  # Todo: make this configurable
-    alpha = 3
-    height, width = img.shape
-
-    if not jump:
-        jump = ceil(min(height, height)*0.007)
-    assert jump > 0, "jump must be greater than 0"
-
-    height_output, width_output = side*ceil(height/jump), side*ceil(width/jump)
-    canvas = np.zeros((height_output, width_output), np.uint8)
-    output_square = np.zeros((side, side), np.uint8)
-    x_output, y_output = 0, 0
-    for y in range(0, height, jump):
-        for x in range(0, width, jump):
-            output_square[:] = 255
-            intensity = 1 - square_avg_value(img[y:y+jump, x:x+jump])/255
-            radius = int(alpha*intensity*side/2)
-            if radius > 0:
-                # draw a circle
-                cv2.circle(
-                    output_square,
-                    center=(side//2, side//2),
-                    radius=radius,
-                    color=(0, 0, 0),
-                    thickness=-1,
-                    lineType=cv2.FILLED
-                )
-            # place the square on the canvas
-            canvas[y_output:y_output+side,
-                   x_output:x_output+side] = output_square
-            x_output += side
-        y_output += side
-        x_output = 0
-    return canvas
+    h, w = img.shape
+    threshold = np.tile(_BAYER8, (h // 8 + 1, w // 8 + 1))[:h, :w]
+    return np.where(img > threshold, 255, 0).astype(np.uint8)
 
 
 def read_img(
@@ -94,17 +85,34 @@ def read_img(
     print_width,
     img_binarization_algo,
 ):
-    im = cv2.imread(filename, cv2.IMREAD_GRAYSCALE)
+    # Read the file ourselves so a missing file surfaces as FileNotFoundError
+    # (cv2.imread just returns None), without a separate existence check.
+    with open(filename, 'rb') as f:
+        buf = np.frombuffer(f.read(), np.uint8)
+    im = cv2.imdecode(buf, cv2.IMREAD_GRAYSCALE)
+    return read_img_from_array(im, print_width, img_binarization_algo)
+
+
+def read_img_from_array(
+    im,
+    print_width,
+    img_binarization_algo,
+):
+    '''Same as read_img, but takes an already loaded 8-bit grayscale image.'''
     height = im.shape[0]
     width = im.shape[1]
-    factor = print_width / width
-    resized = cv2.resize(
-        im,
-        (
-            print_width,
-            int(height * factor)
-        ),
-        interpolation=cv2.INTER_AREA)
+    if width == print_width:
+        # Nothing to resample, e.g. for rendered text. Copy since dithering works in place.
+        resized = im.copy()
+    else:
+        factor = print_width / width
+        resized = cv2.resize(
+            im,
+            (
+                print_width,
+                int(height * factor)
+            ),
+            interpolation=cv2.INTER_AREA)
 
     if img_binarization_algo == 'floyd-steinberg':
         logger.info('⏳ Applying Floyd-Steinberg dithering to image...')
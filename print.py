@@ -1,17 +1,34 @@
 #!/usr/bin/env python
-import argparse
 import asyncio
+import atexit
+import contextlib
+import functools
 import logging
+import math
 import sys
-import os
+import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 
 from catprinter import logger
 from catprinter.cmds import PRINT_WIDTH, cmds_print_img
-from catprinter.ble import run_ble
-from catprinter.img import read_img, show_preview
+from catprinter.ble import get_device_address, run_ble_many
+from catprinter.img import read_img, read_img_from_array, show_preview
+
+# Created on first use and reused across calls, so printing several times in-process
+# doesn't set up and tear down a fresh event loop for every print.
+_loop = None
+
+def _get_loop():
+    global _loop
+    if _loop is None:
+        _loop = asyncio.new_event_loop()
+        atexit.register(_loop.close)
+    return _loop
 
 def parse_args():
+    # Imported here so that using this module as a library doesn't pay for argparse.
+    import argparse
+
     args = argparse.ArgumentParser(
         description='Prints an image or text on your cat thermal printer.')
     args.add_argument('filename', type=str, nargs='?', default=None, 
@@ -46,82 +63,124 @@ def parse_args():
 
 def configure_logger(log_level):
     logger.setLevel(log_level)
-    h = logging.StreamHandler(sys.stdout)
-    h.setLevel(log_level)
-    logger.addHandler(h)
+    # Only attach our handler once, so calling main() repeatedly in-process
+    # doesn't print every message multiple times.
+    if not logger.handlers:
+        h = logging.StreamHandler(sys.stdout)
+        logger.addHandler(h)
+
+@functools.lru_cache(maxsize=32)
+def _load_font(font_path, font_size):
+    return ImageFont.truetype(font_path, font_size)
+
+# Plain ASCII text (the common case for receipts and labels) is drawn from cached
+# per-character glyphs, so it's only rasterized by FreeType once per glyph. Glyphs are
+# placed by their own advance, without kerning, and _text_length measures them the same
+# way so layout matches what gets drawn. Anything else needs real shaping (ligatures,
+# RTL, combining marks) and goes through Pillow.
+@functools.lru_cache(maxsize=1024)
+def _glyph_advance(font_path, font_size, char):
+    return _load_font(font_path, font_size).getlength(char)
+
+@functools.lru_cache(maxsize=1024)
+def _load_glyph(font_path, font_size, char):
+    font = _load_font(font_path, font_size)
+    left, top, right, bottom = font.getbbox(char)
+    mask = Image.new('L', (max(right - left, 1), max(bottom - top, 1)), 0)
+    ImageDraw.Draw(mask).text((-left, -top), char, fill=255, font=font)
+    return (left, top), mask
+
+def _text_length(font, text):
+    if not text.isascii():
+        return font.getlength(text)
+    return sum(_glyph_advance(font.path, font.size, char) for char in text)
+
+def _draw_text(image, xy, text, font, fill=0):
+    if not text.isascii():
+        ImageDraw.Draw(image).text(xy, text, fill=fill, font=font)
+        return
+    x, y = xy
+    for char in text:
+        (left, top), mask = _load_glyph(font.path, font.size, char)
+        image.paste(fill, (round(x) + left, y + top), mask)
+        x += _glyph_advance(font.path, font.size, char)
 
 def apply_styling(text, font_path, font_size, bold=False, italic=False, strikethrough=False):
-    font = ImageFont.truetype(font_path, font_size)
-
     if bold:
-        font = ImageFont.truetype(font_path.replace('.ttf', '-Bold.ttf'), font_size)  
+        font_path = font_path.replace('.ttf', '-Bold.ttf')
 
-    return font, text
+    return _load_font(font_path, font_size), text
 
-def text_to_image(text, output_path, font_path, font_size, max_width, bold=False, italic=False, strikethrough=False, align='left'):
+def text_to_image(text, font_path, font_size, max_width, bold=False, italic=False, strikethrough=False, align='left'):
     font, styled_text = apply_styling(text, font_path, font_size, bold, italic, strikethrough)
 
     lines = styled_text.split('\n')
 
-    temp_image = Image.new('RGB', (1, 1), (255, 255, 255))
-    draw = ImageDraw.Draw(temp_image)
-
-    max_text_width = 0
-    total_height = 0
-    line_heights = []
-
-    for line in lines:
-        text_bbox = draw.textbbox((0, 0), line, font=font)
-        line_width = text_bbox[2] - text_bbox[0]
-        line_height = text_bbox[3] - text_bbox[1]
-        line_heights.append(line_height)
-        max_text_width = max(max_text_width, line_width)
-        total_height += line_height
-
-    while max_text_width > max_width:
-        font_size -= 1
-        font = ImageFont.truetype(font_path, font_size)
-        max_text_width = 0
-        total_height = 0
-        line_heights = []
-        for line in lines:
-            text_bbox = draw.textbbox((0, 0), line, font=font)
-            line_width = text_bbox[2] - text_bbox[0]
-            line_height = text_bbox[3] - text_bbox[1]
-            line_heights.append(line_height)
-            max_text_width = max(max_text_width, line_width)
-            total_height += line_height
+    # Only the horizontal advance matters for fitting and aligning lines, which is
+    # much cheaper to get than a full bbox. Each distinct line is measured once per font.
+    def measure(font):
+        widths = {line: math.ceil(_text_length(font, line)) for line in set(lines)}
+        return widths, max(widths.values())
+
+    widths, max_text_width = measure(font)
+
+    if max_text_width > max_width:
+        # Bisect for the largest font size that fits, keeping the measurements
+        # of the winning size around for the draw phase.
+        lo, hi = 1, font_size - 1
+        best = None
+        while lo <= hi:
+            size = (lo + hi) // 2
+            candidate = _load_font(font.path, size)
+            candidate_widths, candidate_width = measure(candidate)
+            if candidate_width <= max_width:
+                best = size, candidate, candidate_widths, candidate_width
+                lo = size + 1
+            else:
+                hi = size - 1
+        if best is None:
+            font_size = 1
+            font = _load_font(font.path, font_size)
+            widths, max_text_width = measure(font)
+        else:
+            font_size, font, widths, max_text_width = best
+
+    # Resolve every line's width once the font size has settled; the draw loop
+    # below only indexes into these. All lines share the font's ascent + descent.
+    line_widths = [widths[line] for line in lines]
+    line_height = sum(font.getmetrics())
+    total_height = line_height * len(lines)
 
     padding = font_size // 5
 
     image_width = max(max_text_width, max_width)  
-    image = Image.new('RGB', (image_width, total_height + padding * 2), (255, 255, 255))
+    image = Image.new('L', (image_width, total_height + padding * 2), 255)
     draw = ImageDraw.Draw(image)
 
     current_y = padding
-    for line, line_height in zip(lines, line_heights):
+    for i, line in enumerate(lines):
         if strikethrough:
-            line_bbox = draw.textbbox((0, 0), line, font=font)
-            draw.line((line_bbox[0], current_y + line_height // 2, line_bbox[2], current_y + line_height // 2), fill=0, width=2)
+            draw.line((0, current_y + line_height // 2, line_widths[i], current_y + line_height // 2), fill=0, width=2)
 
         if align == 'center':
-            line_width = draw.textbbox((0, 0), line, font=font)[2] - draw.textbbox((0, 0), line, font=font)[0]
-            x_position = (image_width - line_width) // 2
+            x_position = (image_width - line_widths[i]) // 2
         elif align == 'right':
-            line_width = draw.textbbox((0, 0), line, font=font)[2] - draw.textbbox((0, 0), line, font=font)[0]
-            x_position = image_width - line_width
+            x_position = image_width - line_widths[i]
         else:
             x_position = 0  
 
-        draw.text((x_position, current_y), line, fill=(0, 0, 0), font=font)
+        _draw_text(image, (x_position, current_y), line, font)
         current_y += line_height
 
+    # The image is only wider than max_width if the text didn't fit even at the
+    # smallest font size. Lanczos is overkill when barely scaling.
     if image.width != max_width:
         scale_factor = max_width / image.width
         new_height = int(image.height * scale_factor)
-        image = image.resize((max_width, new_height), Image.Resampling.LANCZOS)
+        resample = Image.Resampling.BILINEAR if scale_factor >= 0.9 else Image.Resampling.LANCZOS
+        image = image.resize((max_width, new_height), resample)
 
-    image.save(output_path)
+    return np.asarray(image)
 
 def main():
     args = parse_args()
@@ -130,34 +189,65 @@ def main():
     configure_logger(log_level)
 
     if args.text:
-        filename = 'output_image.png'  
-        text_to_image(args.text, filename, args.font, args.font_size, PRINT_WIDTH, bold=args.bold, italic=args.italic, strikethrough=args.strikethrough, align=args.align)
+        text_img = text_to_image(args.text, args.font, args.font_size, PRINT_WIDTH, bold=args.bold, italic=args.italic, strikethrough=args.strikethrough, align=args.align)
     elif args.filename:
-        filename = args.filename
-        if not os.path.exists(filename):
-            logger.info('🛑 File not found. Exiting.')
-            return
+        text_img = None
     else:
         logger.info('🛑 No input provided. Exiting.')
         return
 
     try:
-        bin_img = read_img(
-            filename,
-            PRINT_WIDTH,
-            args.img_binarization_algo,
-        )
+        if text_img is not None:
+            bin_img = read_img_from_array(
+                text_img,
+                PRINT_WIDTH,
+                args.img_binarization_algo,
+            )
+        else:
+            bin_img = read_img(
+                args.filename,
+                PRINT_WIDTH,
+                args.img_binarization_algo,
+            )
         if args.show_preview:
             show_preview(bin_img)
+    except FileNotFoundError:
+        logger.info('🛑 File not found. Exiting.')
+        return
     except RuntimeError as e:
-        logger.error(f'🛑 {e}')
+        logger.error('🛑 %s', e)
         return
 
-    logger.info(f'✅ Read image: {bin_img.shape} (h, w) pixels')
-    data = cmds_print_img(bin_img, dark_mode=args.darker)
-    logger.info(f'✅ Generated BLE commands: {len(data)} bytes')
+    logger.info('✅ Read image: %s (h, w) pixels', bin_img.shape)
+    _get_loop().run_until_complete(amain([bin_img], device=args.device, dark_mode=args.darker))
+
+async def amain(bin_imgs, device='', dark_mode=False):
+    # Look for the printer while the commands are being generated; the scan takes
+    # seconds, while encoding the images only takes a fraction of that.
+    address_task = asyncio.ensure_future(get_device_address(device))
+    try:
+        payloads = await asyncio.get_running_loop().run_in_executor(
+            None, lambda: [cmds_print_img(bin_img, dark_mode=dark_mode) for bin_img in bin_imgs])
+    except BaseException:
+        # Don't leave the scan running (or its task dangling) if encoding failed.
+        address_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError, RuntimeError):
+            await address_task
+        raise
+    logger.info('✅ Generated BLE commands: %d bytes', sum(len(data) for data in payloads))
+
+    try:
+        address = await address_task
+    except RuntimeError as e:
+        logger.error('🛑 %s', e)
+        return
+    await run_ble_many(payloads, device=address)
 
-    asyncio.run(run_ble(data, device=args.device))
+def print_many(bin_imgs, device='', dark_mode=False):
+    # Prints several already binarized images (see read_img) over a single BLE connection.
+    # This runs its own event loop, so it's sync-only: from async code (or a notebook,
+    # which already has a running loop) await amain(bin_imgs, ...) instead.
+    _get_loop().run_until_complete(amain(bin_imgs, device=device, dark_mode=dark_mode))
 
 if __name__ == '__main__':
     main()